@@ -6,196 +6,504 @@ Handles user authentication and data persistence
 
 import sqlite3
 import hashlib
+import hmac
 import os
 import json
-from datetime import datetime
+import queue
+import struct
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+
+# orjson's loader is several times faster; fall back to the stdlib if it isn't installed
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+# Password hashes are stored as version + iterations + salt + digest. The version
+# byte selects the PBKDF2 digest, so to change algorithm add a new version here;
+# iterations are stored per hash and can be raised in place
+_HASH_VERSIONS = {b'2': 'sha512'}
+_HASH_VERSION = b'2'
+_HASH_ALG = _HASH_VERSIONS[_HASH_VERSION]
+_ITERS = 210000
+_SALT_SIZE = 32
+_HASH_HEADER = struct.Struct('<I')
+
+# Original format: 32-byte salt + PBKDF2-SHA256 digest, 100k iterations
+_LEGACY_HASH_ALG = 'sha256'
+_LEGACY_ITERS = 100000
+_LEGACY_HASH_SIZE = 64
+
+# Hot-path SQL, kept as constants so every call hits the connection's statement cache
+# created_at is written explicitly: databases from before the epoch migration keep
+# their old DEFAULT CURRENT_TIMESTAMP, which CREATE TABLE IF NOT EXISTS can't change
+_SQL_INSERT_USER = "INSERT INTO users (username, password_hash, created_at) VALUES (?, ?, CAST(strftime('%s', 'now') AS INTEGER))"
+_SQL_USER_EXISTS = 'SELECT 1 FROM users WHERE username = ?'
+_SQL_GET_LOGIN = 'SELECT id, password_hash FROM users WHERE username = ?'
+_SQL_UPDATE_LAST_LOGIN = "UPDATE users SET last_login = CAST(strftime('%s', 'now') AS INTEGER) WHERE id = ?"
+_SQL_UPDATE_PASSWORD_HASH = 'UPDATE users SET password_hash = ? WHERE id = ?'
+_SQL_GET_USER_INFO = 'SELECT username, current_room FROM users WHERE id = ?'
+_SQL_UPDATE_ROOM = 'UPDATE users SET current_room = ? WHERE id = ?'
+_SQL_USERS_IN_ROOM = 'SELECT username FROM users WHERE current_room = ?'
+_SQL_MOVE_ITEM = 'UPDATE items SET location_type = ?, location_id = ? WHERE id = ?'
+
+# Bumped whenever _SCHEMA_SQL or seeding changes; databases at this version skip setup
+_SCHEMA_VERSION = 2
+
+# Tables and indexes, run as one script so the whole bootstrap compiles in a single call
+_SCHEMA_SQL = '''
+    -- Users table
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE NOT NULL,
+        password_hash BLOB NOT NULL,
+        current_room TEXT DEFAULT 'alamo_plaza',
+        created_at INTEGER DEFAULT (CAST(strftime('%s', 'now') AS INTEGER)),
+        last_login INTEGER
+    );
+
+    -- Timestamps are unix epoch seconds; convert ISO text left by older versions.
+    -- That text came from datetime.now(), i.e. server local time, so 'utc' shifts it
+    UPDATE users SET created_at = CAST(strftime('%s', created_at, 'utc') AS INTEGER)
+    WHERE typeof(created_at) = 'text';
+    UPDATE users SET last_login = CAST(strftime('%s', last_login, 'utc') AS INTEGER)
+    WHERE typeof(last_login) = 'text';
+
+    -- Rooms table
+    CREATE TABLE IF NOT EXISTS rooms (
+        id TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        description TEXT NOT NULL,
+        exits TEXT DEFAULT '{}'
+    );
+
+    -- NPCs table
+    CREATE TABLE IF NOT EXISTS npcs (
+        id TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        description TEXT NOT NULL,
+        room_id TEXT NOT NULL,
+        responses TEXT DEFAULT '{}',
+        FOREIGN KEY (room_id) REFERENCES rooms (id)
+    );
+
+    -- Items table
+    CREATE TABLE IF NOT EXISTS items (
+        id TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        description TEXT NOT NULL,
+        location_type TEXT NOT NULL,  -- 'room', 'player'
+        location_id TEXT NOT NULL     -- room_id or user_id
+    );
+
+    -- Indexes for per-room and per-player lookups
+    CREATE INDEX IF NOT EXISTS idx_users_room ON users(current_room);
+    CREATE INDEX IF NOT EXISTS idx_items_loc ON items(location_type, location_id);
+    CREATE INDEX IF NOT EXISTS idx_npcs_room ON npcs(room_id);
+
+    -- Meta table (seeding state, etc.)
+    CREATE TABLE IF NOT EXISTS meta (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    );
+'''
+
+# Room for every statement above plus seeding, per connection
+_CACHED_STATEMENTS = 256
+
+# Map up to this much of the database file so page reads skip the read() syscall
+_MMAP_SIZE = 256 * 1024 * 1024
+
+# How long a successful login skips PBKDF2 on re-authentication (seconds)
+_AUTH_CACHE_TTL = 60
+
+# Most logins remembered at once; the least recently used is evicted first
+_AUTH_CACHE_SIZE = 1024
+
+# Most user rows remembered at once; the least recently used is evicted first
+_USER_INFO_CACHE_SIZE = 4096
+
+# How often buffered item moves are written to disk (seconds)
+_MOVE_FLUSH_INTERVAL = 0.1
+
+def _pbkdf2(password, salt, algorithm=_HASH_ALG, iterations=_ITERS):
+    """Derive the PBKDF2-HMAC key for a password"""
+    # hashlib keys the HMAC ipad/opad contexts once and copies them per
+    # iteration in C; a hand-rolled Python loop is ~3x slower
+    return hashlib.pbkdf2_hmac(algorithm, password.encode('utf-8'), salt, iterations)
+
+def _parse_password_hash(stored_hash):
+    """Split a stored hash into (algorithm, iterations, salt, digest), or None if unreadable"""
+    # Legacy hashes have no version prefix, just salt + SHA-256 digest
+    if len(stored_hash) == _LEGACY_HASH_SIZE:
+        return _LEGACY_HASH_ALG, _LEGACY_ITERS, stored_hash[:_SALT_SIZE], stored_hash[_SALT_SIZE:]
+
+    algorithm = _HASH_VERSIONS.get(bytes(stored_hash[:1]))
+    if algorithm is None:
+        return None
+
+    header_end = 1 + _HASH_HEADER.size
+    if len(stored_hash) != header_end + _SALT_SIZE + hashlib.new(algorithm).digest_size:
+        return None
+
+    iterations, = _HASH_HEADER.unpack(stored_hash[1:header_end])
+    salt = stored_hash[header_end:header_end + _SALT_SIZE]
+    return algorithm, iterations, salt, stored_hash[header_end + _SALT_SIZE:]
 
 class MUDDatabase:
-    def __init__(self, db_path='samud.db'):
+    def __init__(self, db_path='samud.db', read_pool_size=4):
         self.db_path = db_path
+
+        # username -> (expiry, user_id, keyed digest of password), least recently used first
+        self._auth_cache = OrderedDict()
+        self._auth_cache_lock = threading.Lock()
+        self._auth_cache_key = os.urandom(32)
+
+        # user_id -> user info, least recently used first; rows only change through update_user_room
+        self._user_info_cache = OrderedDict()
+        self._user_info_cache_lock = threading.Lock()
+
+        # Checked against when a username doesn't exist, so failed logins take the
+        # same time; built by hash_password so it always matches the current format
+        self._dummy_hash = self.hash_password(os.urandom(16).hex())
+
+        # One long-lived read/write connection, serialized by a lock
+        self._write_lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            self.db_path, check_same_thread=False, isolation_level=None, cached_statements=_CACHED_STATEMENTS
+        )
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('PRAGMA temp_store=MEMORY')
+        self._conn.execute('PRAGMA cache_size=-20000')
+        self._conn.execute(f'PRAGMA mmap_size={_MMAP_SIZE}')
+
         self.init_database()
 
-    def init_database(self):
-        """Initialize the database with required tables"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
-        # Users table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                password_hash TEXT NOT NULL,
-                current_room TEXT DEFAULT 'alamo_plaza',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                last_login TIMESTAMP
+        # Small pool of read-only connections so readers don't wait on writers
+        # as_uri() percent-escapes the path, so names with '#', '?' or '%' survive
+        read_uri = Path(self.db_path).resolve().as_uri() + '?mode=ro'
+        self._read_pool = queue.Queue()
+        for _ in range(read_pool_size):
+            conn = sqlite3.connect(
+                read_uri, uri=True, check_same_thread=False, isolation_level=None,
+                cached_statements=_CACHED_STATEMENTS
             )
-        ''')
-
-        # Rooms table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS rooms (
-                id TEXT PRIMARY KEY,
-                name TEXT NOT NULL,
-                description TEXT NOT NULL,
-                exits TEXT DEFAULT '{}'
-            )
-        ''')
-
-        # NPCs table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS npcs (
-                id TEXT PRIMARY KEY,
-                name TEXT NOT NULL,
-                description TEXT NOT NULL,
-                room_id TEXT NOT NULL,
-                responses TEXT DEFAULT '{}',
-                FOREIGN KEY (room_id) REFERENCES rooms (id)
-            )
-        ''')
-
-        # Items table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS items (
-                id TEXT PRIMARY KEY,
-                name TEXT NOT NULL,
-                description TEXT NOT NULL,
-                location_type TEXT NOT NULL,  -- 'room', 'player'
-                location_id TEXT NOT NULL     -- room_id or user_id
-            )
-        ''')
+            conn.execute(f'PRAGMA mmap_size={_MMAP_SIZE}')
+            self._read_pool.put(conn)
+
+        self._load_caches()
+
+        # Item moves are applied to the cache immediately and written in batches
+        self._pending_moves = {}  # item_id -> (location_type, location_id)
+        self._moves_lock = threading.Lock()
+        self._closing = threading.Event()
+        self._flush_thread = threading.Thread(target=self._flush_loop, daemon=True)
+        self._flush_thread.start()
+
+    @contextmanager
+    def _reader(self):
+        """Borrow a read-only connection from the pool"""
+        conn = self._read_pool.get()
+        try:
+            yield conn
+        finally:
+            self._read_pool.put(conn)
+
+    @contextmanager
+    def _writer(self):
+        """Hold the write lock on the shared read/write connection"""
+        with self._write_lock:
+            yield self._conn
+
+    @contextmanager
+    def _query(self, write=False):
+        """Yield a connection, reporting and swallowing database errors"""
+        try:
+            with (self._writer() if write else self._reader()) as conn:
+                yield conn
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
 
-        # Initialize rooms if they don't exist
-        cursor.execute('SELECT COUNT(*) FROM rooms')
-        if cursor.fetchone()[0] == 0:
-            self.create_initial_rooms(cursor)
+    @contextmanager
+    def _transaction(self, script=None):
+        """Run a block of writes, optionally preceded by a SQL script, as one transaction"""
+        with self._writer() as conn:
+            try:
+                if script:
+                    # executescript() commits anything pending first, so BEGIN inside it
+                    conn.executescript('BEGIN;' + script)
+                else:
+                    conn.execute('BEGIN')
+                yield conn
+                conn.execute('COMMIT')
+            except BaseException:
+                # Also covers a failed COMMIT, which leaves the transaction open
+                if conn.in_transaction:
+                    conn.execute('ROLLBACK')
+                raise
+
+    def _load_caches(self):
+        """Load rooms, NPCs and items into memory"""
+        with self._reader() as conn:
+            rooms = conn.execute('SELECT id, name, description, exits FROM rooms').fetchall()
+            npcs = conn.execute('SELECT id, name, description, room_id, responses FROM npcs').fetchall()
+            items = conn.execute('SELECT id, name, description, location_type, location_id FROM items').fetchall()
+
+        # Rooms and NPCs never change after seeding
+        self._room_cache = {}
+        for room_id, name, description, exits in rooms:
+            self._room_cache[room_id] = {
+                'id': room_id,
+                'name': name,
+                'description': description,
+                'exits': _json_loads(exits)
+            }
 
-        # Initialize NPCs if they don't exist
-        cursor.execute('SELECT COUNT(*) FROM npcs')
-        if cursor.fetchone()[0] == 0:
-            self.create_initial_npcs(cursor)
+        self._npc_cache = {}
+        self._npcs_by_room = {}
+        for npc_id, name, description, room_id, responses in npcs:
+            npc = {
+                'id': npc_id,
+                'name': name,
+                'description': description,
+                'room_id': room_id,
+                'responses': _json_loads(responses)
+            }
+            self._npc_cache[npc_id] = npc
+            self._npcs_by_room.setdefault(room_id, []).append(npc)
+
+        # Item names/descriptions are static; locations change via move_item
+        self._item_static = {}
+        self._item_locations = {}      # item_id -> (location_type, location_id)
+        self._items_by_location = {}   # (location_type, location_id) -> {item_id: None}
+        for item_id, name, description, location_type, location_id in items:
+            self._item_static[item_id] = {'name': name, 'description': description}
+            self._place_item(item_id, (location_type, location_id))
+
+    def _place_item(self, item_id, location):
+        """Move an item between location buckets in the item cache"""
+        old_location = self._item_locations.get(item_id)
+        if old_location is not None:
+            self._items_by_location[old_location].pop(item_id, None)
+        self._item_locations[item_id] = location
+        self._items_by_location.setdefault(location, {})[item_id] = None
+
+    def _items_at(self, location):
+        """List cached items at a (location_type, location_id)"""
+        items = []
+        for item_id in list(self._items_by_location.get(location, ())):
+            item = self._item_static[item_id]
+            items.append({
+                'id': item_id,
+                'name': item['name'],
+                'description': item['description']
+            })
+        return items
+
+    def _flush_loop(self):
+        """Write buffered item moves until the database is closed"""
+        while not self._closing.wait(_MOVE_FLUSH_INTERVAL):
+            self._flush_moves()
+
+    def _flush_moves(self):
+        """Write all buffered item moves in one transaction"""
+        with self._moves_lock:
+            if not self._pending_moves:
+                return
+            batch = self._pending_moves
+            self._pending_moves = {}
+
+        try:
+            with self._transaction() as conn:
+                conn.executemany(_SQL_MOVE_ITEM, [
+                    (location_type, location_id, item_id)
+                    for item_id, (location_type, location_id) in batch.items()
+                ])
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            # Retry next time unless the item has moved again since
+            with self._moves_lock:
+                for item_id, location in batch.items():
+                    self._pending_moves.setdefault(item_id, location)
+
+    def close(self):
+        """Flush pending writes and close all database connections"""
+        self._closing.set()
+        self._flush_thread.join()
+        self._flush_moves()
+
+        while not self._read_pool.empty():
+            self._read_pool.get_nowait().close()
+        with self._write_lock:
+            self._conn.close()
 
-        # Initialize items if they don't exist
-        cursor.execute('SELECT COUNT(*) FROM items')
-        if cursor.fetchone()[0] == 0:
-            self.create_initial_items(cursor)
+    def init_database(self):
+        """Initialize the database with required tables"""
+        with self._writer() as conn:
+            schema_version = conn.execute('PRAGMA user_version').fetchone()[0]
 
-        conn.commit()
-        conn.close()
+        if schema_version < _SCHEMA_VERSION:
+            with self._transaction(_SCHEMA_SQL) as conn:
+                self._seed_tables(conn.cursor())
+                conn.execute(f'PRAGMA user_version = {_SCHEMA_VERSION}')
         print(f"Database initialized: {self.db_path}")
 
+    def _seed_tables(self, cursor):
+        """Seed initial world data on first run"""
+        cursor.execute("SELECT 1 FROM meta WHERE key = 'seeded_v1'")
+        if not cursor.fetchone():
+            # Initialize rooms if they don't exist
+            cursor.execute('SELECT 1 FROM rooms LIMIT 1')
+            if not cursor.fetchone():
+                self.create_initial_rooms(cursor)
+
+            # Initialize NPCs if they don't exist
+            cursor.execute('SELECT 1 FROM npcs LIMIT 1')
+            if not cursor.fetchone():
+                self.create_initial_npcs(cursor)
+
+            # Initialize items if they don't exist
+            cursor.execute('SELECT 1 FROM items LIMIT 1')
+            if not cursor.fetchone():
+                self.create_initial_items(cursor)
+
+            cursor.execute("INSERT INTO meta (key, value) VALUES ('seeded_v1', '1')")
+
     def hash_password(self, password):
         """Hash a password with salt"""
-        salt = os.urandom(32)
-        password_hash = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, 100000)
-        return salt + password_hash
+        salt = os.urandom(_SALT_SIZE)
+        return _HASH_VERSION + _HASH_HEADER.pack(_ITERS) + salt + _pbkdf2(password, salt, _HASH_ALG, _ITERS)
 
     def verify_password(self, password, stored_hash):
         """Verify a password against stored hash"""
-        salt = stored_hash[:32]
-        stored_password_hash = stored_hash[32:]
-        password_hash = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, 100000)
-        return password_hash == stored_password_hash
+        parsed = _parse_password_hash(stored_hash)
+        if parsed is None:
+            # Unknown version or truncated; still hash so the failure takes the usual time
+            _pbkdf2(password, os.urandom(_SALT_SIZE))
+            return False
+        algorithm, iterations, salt, stored_password_hash = parsed
+        return hmac.compare_digest(_pbkdf2(password, salt, algorithm, iterations), stored_password_hash)
+
+    def needs_rehash(self, stored_hash):
+        """Check whether a stored hash uses outdated parameters"""
+        parsed = _parse_password_hash(stored_hash)
+        return parsed is None or parsed[0] != _HASH_ALG or parsed[1] != _ITERS
 
     def create_user(self, username, password):
-        """Create a new user account"""
+        """Create a new user account, returning (True, user_id) on success"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            # Check for a taken name before paying for PBKDF2
+            with self._reader() as conn:
+                if conn.execute(_SQL_USER_EXISTS, (username,)).fetchone():
+                    return False, "Username already exists"
 
-            # Check if username already exists
-            cursor.execute('SELECT id FROM users WHERE username = ?', (username,))
-            if cursor.fetchone():
-                conn.close()
-                return False, "Username already exists"
-
-            # Hash password and create user
+            # Hash password and create user; the UNIQUE constraint still catches a racing signup
             password_hash = self.hash_password(password)
-            cursor.execute('''
-                INSERT INTO users (username, password_hash, created_at)
-                VALUES (?, ?, ?)
-            ''', (username, password_hash, datetime.now()))
+            with self._writer() as conn:
+                user_id = conn.execute(_SQL_INSERT_USER, (username, sqlite3.Binary(password_hash))).lastrowid
 
-            conn.commit()
-            conn.close()
-            return True, "Account created successfully"
+            return True, user_id
 
+        except sqlite3.IntegrityError:
+            return False, "Username already exists"
         except sqlite3.Error as e:
             return False, f"Database error: {e}"
 
+    def _auth_cache_get(self, username, now):
+        """Look up a cached login, dropping it if it has expired"""
+        with self._auth_cache_lock:
+            cached = self._auth_cache.get(username)
+            if cached is None:
+                return None
+            if cached[0] <= now:
+                del self._auth_cache[username]
+                return None
+            self._auth_cache.move_to_end(username)
+            return cached
+
+    def _auth_cache_put(self, username, entry):
+        """Remember a successful login, evicting the least recently used past the cap"""
+        with self._auth_cache_lock:
+            self._auth_cache[username] = entry
+            self._auth_cache.move_to_end(username)
+            while len(self._auth_cache) > _AUTH_CACHE_SIZE:
+                self._auth_cache.popitem(last=False)
+
     def authenticate_user(self, username, password):
         """Authenticate a user login"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-
-            cursor.execute('''
-                SELECT id, password_hash FROM users WHERE username = ?
-            ''', (username,))
-
-            result = cursor.fetchone()
-            if not result:
-                conn.close()
-                return False, "Invalid username or password"
-
-            user_id, stored_hash = result
-
-            if self.verify_password(password, stored_hash):
-                # Update last login
-                cursor.execute('''
-                    UPDATE users SET last_login = ? WHERE id = ?
-                ''', (datetime.now(), user_id))
-                conn.commit()
-                conn.close()
-                return True, user_id
+            now = time.monotonic()
+            digest = hmac.new(self._auth_cache_key, password.encode('utf-8'), 'sha256').digest()
+
+            # Recently verified with the same password, skip PBKDF2
+            cached = self._auth_cache_get(username, now)
+            if cached and hmac.compare_digest(cached[2], digest):
+                user_id = cached[1]
             else:
-                conn.close()
-                return False, "Invalid username or password"
+                with self._reader() as conn:
+                    result = conn.execute(_SQL_GET_LOGIN, (username,)).fetchone()
+
+                if not result:
+                    self.verify_password(password, self._dummy_hash)
+                    return False, "Invalid username or password"
+
+                user_id, stored_hash = result
+
+                if not self.verify_password(password, stored_hash):
+                    return False, "Invalid username or password"
+
+                # Upgrade hashes made with older parameters while we have the password
+                if self.needs_rehash(stored_hash):
+                    new_hash = self.hash_password(password)
+                    with self._writer() as conn:
+                        conn.execute(_SQL_UPDATE_PASSWORD_HASH, (sqlite3.Binary(new_hash), user_id))
+
+                self._auth_cache_put(username, (now + _AUTH_CACHE_TTL, user_id, digest))
+
+            # Update last login
+            with self._writer() as conn:
+                conn.execute(_SQL_UPDATE_LAST_LOGIN, (user_id,))
+            return True, user_id
 
         except sqlite3.Error as e:
             return False, f"Database error: {e}"
 
     def get_user_info(self, user_id):
         """Get user information by ID"""
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-
-            cursor.execute('''
-                SELECT username, current_room FROM users WHERE id = ?
-            ''', (user_id,))
-
-            result = cursor.fetchone()
-            conn.close()
-
+        with self._user_info_cache_lock:
+            user_info = self._user_info_cache.get(user_id)
+            if user_info:
+                self._user_info_cache.move_to_end(user_id)
+                return dict(user_info)
+
+        with self._query() as conn:
+            result = conn.execute(_SQL_GET_USER_INFO, (user_id,)).fetchone()
             if result:
-                return {
+                user_info = {
                     'username': result[0],
                     'current_room': result[1]
                 }
-            return None
-
-        except sqlite3.Error as e:
-            print(f"Database error: {e}")
-            return None
+                with self._user_info_cache_lock:
+                    self._user_info_cache[user_id] = user_info
+                    while len(self._user_info_cache) > _USER_INFO_CACHE_SIZE:
+                        self._user_info_cache.popitem(last=False)
+                return dict(user_info)
+        return None
 
     def update_user_room(self, user_id, room_id):
         """Update user's current room"""
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-
-            cursor.execute('''
-                UPDATE users SET current_room = ? WHERE id = ?
-            ''', (room_id, user_id))
-
-            conn.commit()
-            conn.close()
+        with self._query(write=True) as conn:
+            conn.execute(_SQL_UPDATE_ROOM, (room_id, user_id))
+            with self._user_info_cache_lock:
+                self._user_info_cache.pop(user_id, None)
             return True
-
-        except sqlite3.Error as e:
-            print(f"Database error: {e}")
-            return False
+        return False
 
     def create_initial_rooms(self, cursor):
         """Create the initial San Antonio themed rooms"""
@@ -244,58 +552,23 @@ class MUDDatabase:
             }
         ]
 
-        for room in rooms:
-            cursor.execute('''
-                INSERT INTO rooms (id, name, description, exits)
-                VALUES (?, ?, ?, ?)
-            ''', (room['id'], room['name'], room['description'], json.dumps(room['exits'])))
+        cursor.executemany('''
+            INSERT INTO rooms (id, name, description, exits)
+            VALUES (?, ?, ?, ?)
+        ''', [(room['id'], room['name'], room['description'], json.dumps(room['exits'])) for room in rooms])
 
         print("Initial rooms created")
 
     def get_room(self, room_id):
         """Get room information by ID"""
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-
-            cursor.execute('''
-                SELECT name, description, exits FROM rooms WHERE id = ?
-            ''', (room_id,))
-
-            result = cursor.fetchone()
-            conn.close()
-
-            if result:
-                return {
-                    'id': room_id,
-                    'name': result[0],
-                    'description': result[1],
-                    'exits': json.loads(result[2])
-                }
-            return None
-
-        except sqlite3.Error as e:
-            print(f"Database error: {e}")
-            return None
+        room = self._room_cache.get(room_id)
+        return dict(room) if room else None
 
     def get_users_in_room(self, room_id):
         """Get list of users currently in a room"""
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-
-            cursor.execute('''
-                SELECT username FROM users WHERE current_room = ?
-            ''', (room_id,))
-
-            results = cursor.fetchall()
-            conn.close()
-
-            return [result[0] for result in results]
-
-        except sqlite3.Error as e:
-            print(f"Database error: {e}")
-            return []
+        with self._query() as conn:
+            return [result[0] for result in conn.execute(_SQL_USERS_IN_ROOM, (room_id,))]
+        return []
 
     def create_initial_npcs(self, cursor):
         """Create the initial NPCs for San Antonio rooms"""
@@ -367,68 +640,32 @@ class MUDDatabase:
             }
         ]
 
-        for npc in npcs:
-            cursor.execute('''
-                INSERT INTO npcs (id, name, description, room_id, responses)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (npc['id'], npc['name'], npc['description'], npc['room_id'], json.dumps(npc['responses'])))
+        cursor.executemany('''
+            INSERT INTO npcs (id, name, description, room_id, responses)
+            VALUES (?, ?, ?, ?, ?)
+        ''', [
+            (npc['id'], npc['name'], npc['description'], npc['room_id'], json.dumps(npc['responses']))
+            for npc in npcs
+        ])
 
         print("Initial NPCs created")
 
     def get_npcs_in_room(self, room_id):
         """Get list of NPCs in a room"""
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-
-            cursor.execute('''
-                SELECT id, name, description, responses FROM npcs WHERE room_id = ?
-            ''', (room_id,))
-
-            results = cursor.fetchall()
-            conn.close()
-
-            npcs = []
-            for result in results:
-                npcs.append({
-                    'id': result[0],
-                    'name': result[1],
-                    'description': result[2],
-                    'responses': json.loads(result[3])
-                })
-
-            return npcs
-
-        except sqlite3.Error as e:
-            print(f"Database error: {e}")
-            return []
+        return [
+            {
+                'id': npc['id'],
+                'name': npc['name'],
+                'description': npc['description'],
+                'responses': npc['responses']
+            }
+            for npc in self._npcs_by_room.get(room_id, [])
+        ]
 
     def get_npc(self, npc_id):
         """Get NPC by ID"""
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-
-            cursor.execute('''
-                SELECT name, description, room_id, responses FROM npcs WHERE id = ?
-            ''', (npc_id,))
-
-            result = cursor.fetchone()
-            conn.close()
-
-            if result:
-                return {
-                    'id': npc_id,
-                    'name': result[0],
-                    'description': result[1],
-                    'room_id': result[2],
-                    'responses': json.loads(result[3])
-                }
-            return None
-
-        except sqlite3.Error as e:
-            print(f"Database error: {e}")
-            return None
+        npc = self._npc_cache.get(npc_id)
+        return dict(npc) if npc else None
 
     def create_initial_items(self, cursor):
         """Create the initial items for San Antonio rooms"""
@@ -484,112 +721,45 @@ class MUDDatabase:
             }
         ]
 
-        for item in items:
-            cursor.execute('''
-                INSERT INTO items (id, name, description, location_type, location_id)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (item['id'], item['name'], item['description'], item['location_type'], item['location_id']))
+        cursor.executemany('''
+            INSERT INTO items (id, name, description, location_type, location_id)
+            VALUES (?, ?, ?, ?, ?)
+        ''', [
+            (item['id'], item['name'], item['description'], item['location_type'], item['location_id'])
+            for item in items
+        ])
 
         print("Initial items created")
 
     def get_items_in_room(self, room_id):
         """Get list of items in a room"""
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-
-            cursor.execute('''
-                SELECT id, name, description FROM items
-                WHERE location_type = 'room' AND location_id = ?
-            ''', (room_id,))
-
-            results = cursor.fetchall()
-            conn.close()
-
-            items = []
-            for result in results:
-                items.append({
-                    'id': result[0],
-                    'name': result[1],
-                    'description': result[2]
-                })
-
-            return items
-
-        except sqlite3.Error as e:
-            print(f"Database error: {e}")
-            return []
+        return self._items_at(('room', room_id))
 
     def get_player_items(self, user_id):
         """Get list of items carried by a player"""
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-
-            cursor.execute('''
-                SELECT id, name, description FROM items
-                WHERE location_type = 'player' AND location_id = ?
-            ''', (str(user_id),))
-
-            results = cursor.fetchall()
-            conn.close()
-
-            items = []
-            for result in results:
-                items.append({
-                    'id': result[0],
-                    'name': result[1],
-                    'description': result[2]
-                })
-
-            return items
-
-        except sqlite3.Error as e:
-            print(f"Database error: {e}")
-            return []
+        return self._items_at(('player', str(user_id)))
 
     def move_item(self, item_id, new_location_type, new_location_id):
         """Move an item to a new location"""
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-
-            cursor.execute('''
-                UPDATE items SET location_type = ?, location_id = ? WHERE id = ?
-            ''', (new_location_type, str(new_location_id), item_id))
-
-            success = cursor.rowcount > 0
-            conn.commit()
-            conn.close()
-            return success
-
-        except sqlite3.Error as e:
-            print(f"Database error: {e}")
+        if item_id not in self._item_static:
             return False
 
+        location = (new_location_type, str(new_location_id))
+        with self._moves_lock:
+            self._place_item(item_id, location)
+            self._pending_moves[item_id] = location
+        return True
+
     def get_item(self, item_id):
         """Get item by ID"""
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-
-            cursor.execute('''
-                SELECT name, description, location_type, location_id FROM items WHERE id = ?
-            ''', (item_id,))
-
-            result = cursor.fetchone()
-            conn.close()
-
-            if result:
-                return {
-                    'id': item_id,
-                    'name': result[0],
-                    'description': result[1],
-                    'location_type': result[2],
-                    'location_id': result[3]
-                }
-            return None
-
-        except sqlite3.Error as e:
-            print(f"Database error: {e}")
-            return None
\ No newline at end of file
+        item = self._item_static.get(item_id)
+        if item:
+            location_type, location_id = self._item_locations[item_id]
+            return {
+                'id': item_id,
+                'name': item['name'],
+                'description': item['description'],
+                'location_type': location_type,
+                'location_id': location_id
+            }
+        return None
\ No newline at end of file
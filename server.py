@@ -4,134 +4,388 @@ San Antonio MUD Server
 Basic telnet server that accepts connections on port 2323
 """
 
+import asyncio
+import os
 import socket
-import threading
 import sys
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from database import MUDDatabase
 
+# uvloop (libuv) is a faster drop-in event loop; fall back to asyncio's own if it isn't installed
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+# Bytes requested per read, and the longest line a client may send before being dropped
+READ_SIZE = 4096
+MAX_LINE_LENGTH = 64 * 1024
+
+# Kernel send buffer per client, so a burst of broadcasts doesn't fill it
+SEND_BUFFER_SIZE = 256 * 1024
+
+# Output a client may leave unread before it is disconnected
+MAX_PENDING_OUTPUT = 1024 * 1024
+
+# Short and long direction names -> the exit names rooms use
+DIRECTION_MAP = {
+    'n': 'north', 'north': 'north',
+    's': 'south', 'south': 'south',
+    'e': 'east', 'east': 'east',
+    'w': 'west', 'west': 'west'
+}
+
+# Static text, encoded once at import so sending it is a plain buffer copy
+PROMPT = b"> "
+
+WELCOME_MSG = (
+    "╔════════════════════════════════════════════════════════════════╗\n"
+    "║           Welcome to the San Antonio MUD (SAMUD)              ║\n"
+    "║                                                                ║\n"
+    "║   Experience the Alamo City through text-based adventure!     ║\n"
+    "║                                                                ║\n"
+    "║   Commands:                                                    ║\n"
+    "║   • 'login' - Log in to existing account                      ║\n"
+    "║   • 'signup' - Create a new account                           ║\n"
+    "║   • 'help' - Show available commands                          ║\n"
+    "║   • 'quit' - Disconnect from the server                       ║\n"
+    "╚════════════════════════════════════════════════════════════════╝\n"
+    "> "
+).encode('utf-8')
+
+HELP_MSG = (
+    "=== SAN ANTONIO MUD COMMANDS ===\n\n"
+    "🔍 EXPLORING:\n"
+    "  look - Show room description, exits, people, and items\n"
+    "  move <direction> - Move to another room\n"
+    "  n/s/e/w - Quick movement (north/south/east/west)\n"
+    "  where - Show your current location\n\n"
+    "🎒 ITEMS:\n"
+    "  get <item> - Pick up an item from the room\n"
+    "  drop <item> - Drop an item from your inventory\n"
+    "  inventory (inv/i) - Show what you're carrying\n\n"
+    "🗣️ NPCs:\n"
+    "  talk <npc> [keyword] - Talk to NPCs (try: history, food, music)\n\n"
+    "💬 COMMUNICATION:\n"
+    "  say <message> - Talk to people in the same room\n"
+    "  shout <message> - Send message to all players\n"
+    "  who - Show online players\n\n"
+    "⚙️ SYSTEM:\n"
+    "  help - Show this help\n"
+    "  quit - Exit the MUD\n\n"
+    "💡 TIP: Most commands work with partial names!\n"
+    "    Example: 'get guitar' instead of 'get a tortoiseshell guitar pick'\n"
+    "===============================\n> "
+).encode('utf-8')
+
+SIGNUP_GUIDE_MSG = (
+    "=== WELCOME GUIDE ===\n"
+    "You're now in The Alamo Plaza. Here are some basic commands to get started:\n\n"
+    "🔍 Exploring:\n"
+    "  'look' - See your surroundings, exits, people, and items\n"
+    "  'n/s/e/w' - Move north/south/east/west\n"
+    "  'where' - Check your current location\n\n"
+    "💬 Communication:\n"
+    "  'say <message>' - Talk to people in the same room\n"
+    "  'shout <message>' - Send message to everyone in the world\n"
+    "  'who' - See who's online\n\n"
+    "🎒 Items:\n"
+    "  'get <item>' - Pick up items you find\n"
+    "  'drop <item>' - Drop items from your inventory\n"
+    "  'inventory' (or 'inv') - See what you're carrying\n\n"
+    "🗣️ NPCs:\n"
+    "  'talk <npc>' - Chat with characters (try keywords!)\n\n"
+    "❓ Need help? Type 'help' anytime!\n"
+    "==================\n\n"
+).encode('utf-8')
+
+def build_name_index(things):
+    """Map each lowercased name, and each word of it, to the first thing that has it"""
+    index = {}
+    for thing in things:
+        name = thing['name'].lower()
+        index.setdefault(name, thing)
+        for word in name.split():
+            index.setdefault(word, thing)
+    return index
+
+def describe_lines(things):
+    """One '  name - description' line per NPC or item"""
+    return ''.join(f"  {thing['name']} - {thing['description']}\n" for thing in things)
+
+def find_by_name(index, name):
+    """Find a thing by exact name or word, falling back to a partial match"""
+    name = name.lower()
+    target = index.get(name)
+    if target is None:
+        # Every full name is a key, so a substring scan of the keys is a partial match
+        for key, thing in index.items():
+            if name in key:
+                return thing
+    return target
+
 class ClientSession:
-    def __init__(self, socket, address):
-        self.socket = socket
+    def __init__(self, reader, writer, address, dirty_sessions):
+        self.reader = reader
+        self.writer = writer
         self.address = address
         self.authenticated = False
         self.user_id = None
         self.username = None
+        self.current_room = None  # kept in step with users.current_room by handle_move
         self.auth_state = 'welcome'  # welcome, login_username, login_password, signup_username, signup_password
+        self.recv_buf = bytearray()  # input received but not yet split into lines
+        self.outbox = []  # encoded messages waiting for the next flush
+        self.dirty_sessions = dirty_sessions  # server-wide set of sessions with queued output
+
+    def send(self, msg):
+        """Queue a message for the client"""
+        self.send_bytes(msg.encode('utf-8'))
+
+    def send_bytes(self, data):
+        """Queue an already-encoded message for the client"""
+        if not self.outbox:
+            self.dirty_sessions.add(self)
+        self.outbox.append(data)
+
+    def flush(self):
+        """Write all queued messages to the transport at once"""
+        if self.outbox and not self.writer.is_closing():
+            # writelines hands the chunks to the kernel together (sendmsg on Python 3.12+)
+            self.writer.writelines(self.outbox)
+            if self.writer.transport.get_write_buffer_size() > MAX_PENDING_OUTPUT:
+                # Not reading its output; drop it rather than buffer without limit
+                print(f"Dropping slow client {self.address}")
+                self.writer.transport.abort()
+        self.outbox.clear()
+
+    def close(self):
+        """Close the connection once queued output is sent"""
+        self.flush()
+        self.writer.close()
 
 class MUDServer:
     def __init__(self, host='0.0.0.0', port=2323):
         self.host = host
         self.port = port
-        self.clients = []
-        self.sessions = {}  # socket -> ClientSession
+        self.client_tasks = set()
+        self.sessions = {}  # writer -> ClientSession
+        self.dirty_sessions = set()
+        self.room_cache = {}  # room_id -> room dict; rooms never change while running
+        self.item_cache = {}  # (location_type, location_id) -> (items, name index, encoded listing); dropped when items move
+        self.room_occupants = defaultdict(set)  # room_id -> logged-in sessions in that room
+        self.authed_sessions = {}  # logged-in sessions, in login order (values unused)
         self.running = False
+        self.loop = None
+        self.stop_event = None
         self.db = MUDDatabase()
+        # Password hashing is CPU-bound but releases the GIL; keep it off the event loop,
+        # one worker per core so a burst of logins finishes in order instead of thrashing
+        self.auth_pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix='auth')
 
     def start(self):
         """Start the MUD server"""
-        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-
         try:
-            self.server_socket.bind((self.host, self.port))
-            self.server_socket.listen(5)
-            self.running = True
-
-            print(f"San Antonio MUD Server starting on {self.host}:{self.port}")
-            print("Press Ctrl+C to stop the server")
-            print("="*50)
-
-            # Get and display local IP address
-            try:
-                import socket as sock
-                hostname = sock.gethostname()
-                local_ip = sock.gethostbyname(hostname)
-                print(f"🌐 Server accessible at:")
-                print(f"   Local:    telnet localhost {self.port}")
-                print(f"             nc localhost {self.port}")
-                print(f"   Network:  telnet {local_ip} {self.port}")
-                print(f"             nc {local_ip} {self.port}")
-            except:
-                print(f"🌐 Server accessible at:")
-                print(f"   Local:    telnet localhost {self.port}")
-                print(f"             nc localhost {self.port}")
-
-            print("="*50)
-
-            while self.running:
-                try:
-                    client_socket, address = self.server_socket.accept()
-                    print(f"New connection from {address}")
-
-                    # Create a new thread for each client
-                    client_thread = threading.Thread(
-                        target=self.handle_client,
-                        args=(client_socket, address)
-                    )
-                    client_thread.daemon = True
-                    client_thread.start()
-
-                except socket.error:
-                    if self.running:
-                        print("Error accepting connection")
-
+            if uvloop is None:
+                asyncio.run(self.serve())
+            elif hasattr(uvloop, 'run'):
+                uvloop.run(self.serve())
+            else:
+                # uvloop.run() arrived in 0.18; older releases only offer the loop policy
+                uvloop.install()
+                asyncio.run(self.serve())
         except KeyboardInterrupt:
             print("\nShutting down server...")
         except Exception as e:
             print(f"Server error: {e}")
         finally:
-            self.stop()
+            self.running = False
+            self.auth_pool.shutdown()
+            self.db.close()
+            print("Server stopped")
+
+    async def serve(self):
+        """Accept connections on a single event loop until stopped"""
+        self.loop = asyncio.get_running_loop()
+        self.stop_event = asyncio.Event()
+        server = await asyncio.start_server(self.handle_client, self.host, self.port, reuse_address=True)
+        self.running = True
+
+        print(f"San Antonio MUD Server starting on {self.host}:{self.port}")
+        print(f"Event loop: {'uvloop' if uvloop is not None else 'asyncio'}")
+        print("Press Ctrl+C to stop the server")
+        print("="*50)
+
+        # Get and display local IP address
+        try:
+            hostname = socket.gethostname()
+            local_ip = socket.gethostbyname(hostname)
+            print(f"🌐 Server accessible at:")
+            print(f"   Local:    telnet localhost {self.port}")
+            print(f"             nc localhost {self.port}")
+            print(f"   Network:  telnet {local_ip} {self.port}")
+            print(f"             nc {local_ip} {self.port}")
+        except:
+            print(f"🌐 Server accessible at:")
+            print(f"   Local:    telnet localhost {self.port}")
+            print(f"             nc localhost {self.port}")
+
+        print("="*50)
 
-    def handle_client(self, client_socket, address):
+        async with server:
+            try:
+                await self.stop_event.wait()
+            finally:
+                # Close all client connections and let their handlers finish
+                for writer in self.sessions:
+                    writer.close()
+                await asyncio.gather(*self.client_tasks, return_exceptions=True)
+
+    async def handle_client(self, reader, writer):
         """Handle individual client connection"""
+        address = writer.get_extra_info('peername')
+        print(f"New connection from {address}")
+        task = asyncio.current_task()
+        self.client_tasks.add(task)
+        self.tune_socket(writer)
+
         try:
             # Create session
-            session = ClientSession(client_socket, address)
-            self.clients.append(client_socket)
-            self.sessions[client_socket] = session
+            session = ClientSession(reader, writer, address, self.dirty_sessions)
+            self.sessions[writer] = session
 
             # Send welcome message
             self.send_welcome(session)
+            self.flush_output()
 
-            while self.running:
+            recv_buf = session.recv_buf
+            while self.running and not writer.is_closing():
                 try:
-                    # Receive data from client
-                    data = client_socket.recv(1024).decode('utf-8').strip()
-
-                    if not data:
-                        break
-
-                    print(f"Received from {address}: {data}")
+                    # Receive whatever has arrived; a command may span reads
+                    chunk = await reader.read(READ_SIZE)
+                except ConnectionError:
+                    break
+                if not chunk:
+                    # Disconnected
+                    break
+                recv_buf += chunk
+
+                # Handle every complete line, then drop them from the buffer in one go
+                start = 0
+                with memoryview(recv_buf) as view:
+                    while not writer.is_closing():
+                        end = recv_buf.find(b'\n', start)
+                        if end < 0:
+                            break
+                        data = str(view[start:end], 'utf-8', 'ignore').strip()
+                        start = end + 1
+                        await self.handle_line(session, data)
+                del recv_buf[:start]
+
+                if len(recv_buf) > MAX_LINE_LENGTH:
+                    # Sent an overlong line
+                    break
 
-                    # Handle based on authentication state
-                    if not session.authenticated:
-                        self.handle_auth(session, data)
-                    else:
-                        self.handle_game_command(session, data)
+                # One write per recipient for everything these commands produced
+                self.flush_output()
 
-                except socket.error:
+                if writer.is_closing():
                     break
+                await writer.drain()
 
         except Exception as e:
             print(f"Error handling client {address}: {e}")
         finally:
             # Clean up
-            if client_socket in self.clients:
-                self.clients.remove(client_socket)
-            if client_socket in self.sessions:
-                del self.sessions[client_socket]
-            client_socket.close()
+            self.sessions.pop(writer, None)
+            self.dirty_sessions.discard(session)
+            self.authed_sessions.pop(session, None)
+            if session.current_room is not None:
+                self.room_occupants[session.current_room].discard(session)
+            writer.close()
+            self.client_tasks.discard(task)
             print(f"Client {address} disconnected")
 
-    def get_cute_player_box(self, current_user_id, room_id):
+    def tune_socket(self, writer):
+        """Set socket options for small, interactive messages"""
+        sock = writer.get_extra_info('socket')
+        if sock is None:
+            return
+        try:
+            # Send each prompt right away instead of waiting on Nagle's algorithm
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            # Notice dead peers that never close their side
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SEND_BUFFER_SIZE)
+        except OSError as e:
+            print(f"Could not set socket options for {writer.get_extra_info('peername')}: {e}")
+
+    async def handle_line(self, session, data):
+        """Dispatch one line of input from a client"""
+        print(f"Received from {session.address}: {data}")
+
+        # Handle based on authentication state
+        if not session.authenticated:
+            await self.handle_auth(session, data)
+        else:
+            self.handle_game_command(session, data)
+
+    def flush_output(self):
+        """Write out queued messages for every session that has any"""
+        for session in self.dirty_sessions:
+            session.flush()
+        self.dirty_sessions.clear()
+
+    def get_room(self, room_id):
+        """Get a room, loading it into the server's room cache on first use"""
+        room = self.room_cache.get(room_id)
+        if room is None:
+            room = self.db.get_room(room_id)
+            if room:
+                # NPCs never move, so their name index lives with the room
+                room['npcs'] = self.db.get_npcs_in_room(room_id)
+                room['npc_index'] = build_name_index(room['npcs'])
+
+                # Pre-render the parts of look/move output that never change
+                if room['exits']:
+                    exits = f"Exits: {', '.join(room['exits'])}\n"
+                else:
+                    exits = "No obvious exits\n"
+                room['static_bytes'] = f"{room['name']}\n{room['description']}\n{exits}".encode('utf-8')
+                if room['npcs']:
+                    npcs = "NPCs here:\n" + describe_lines(room['npcs'])
+                else:
+                    npcs = "NPCs here: none\n"
+                room['npc_bytes'] = npcs.encode('utf-8')
+
+                self.room_cache[room_id] = room
+        return room
+
+    def get_items(self, location_type, location_id):
+        """Get the items at a location, their name index and listing, cached until an item moves"""
+        location = (location_type, location_id)
+        cached = self.item_cache.get(location)
+        if cached is None:
+            if location_type == 'room':
+                items = self.db.get_items_in_room(location_id)
+            else:
+                items = self.db.get_player_items(location_id)
+            listing = describe_lines(items).encode('utf-8')
+            cached = self.item_cache[location] = (items, build_name_index(items), listing)
+        return cached
+
+    def forget_items(self, session):
+        """Invalidate cached items for a session's room and inventory after a move"""
+        self.item_cache.pop(('room', session.current_room), None)
+        self.item_cache.pop(('player', session.user_id), None)
+
+    def get_cute_player_box(self, session, room_id):
         """Generate cute player count box"""
         players_here = self.db.get_users_in_room(room_id)
 
-        # Get current user's name to exclude from "others" list
-        current_user_info = self.db.get_user_info(current_user_id) if current_user_id else None
-        current_username = current_user_info['username'] if current_user_info else None
-
         # Exclude current user from the list of others
+        current_username = session.username
         other_players = [p for p in players_here if p != current_username] if current_username else players_here
         total_players = len(other_players) + (1 if current_username else 0)
 
@@ -151,45 +405,35 @@ class MUDServer:
 
     def send_welcome(self, session):
         """Send welcome message to new client"""
-        msg = "╔════════════════════════════════════════════════════════════════╗\n"
-        msg += "║           Welcome to the San Antonio MUD (SAMUD)              ║\n"
-        msg += "║                                                                ║\n"
-        msg += "║   Experience the Alamo City through text-based adventure!     ║\n"
-        msg += "║                                                                ║\n"
-        msg += "║   Commands:                                                    ║\n"
-        msg += "║   • 'login' - Log in to existing account                      ║\n"
-        msg += "║   • 'signup' - Create a new account                           ║\n"
-        msg += "║   • 'help' - Show available commands                          ║\n"
-        msg += "║   • 'quit' - Disconnect from the server                       ║\n"
-        msg += "╚════════════════════════════════════════════════════════════════╝\n"
-        msg += "> "
-        session.socket.send(msg.encode('utf-8'))
-
-    def handle_auth(self, session, data):
+        session.send_bytes(WELCOME_MSG)
+
+    async def handle_auth(self, session, data):
         """Handle authentication flow"""
         data = data.lower().strip()
 
         if session.auth_state == 'welcome':
             if data == 'login':
                 session.auth_state = 'login_username'
-                session.socket.send("Username: ".encode('utf-8'))
+                session.send("Username: ")
             elif data == 'signup':
                 session.auth_state = 'signup_username'
-                session.socket.send("Choose a username: ".encode('utf-8'))
+                session.send("Choose a username: ")
             elif data == 'quit':
-                session.socket.send("Goodbye!\n".encode('utf-8'))
-                session.socket.close()
+                session.send("Goodbye!\n")
+                session.close()
             else:
                 msg = "Please type 'login', 'signup', or 'quit'\n> "
-                session.socket.send(msg.encode('utf-8'))
+                session.send(msg)
 
         elif session.auth_state == 'login_username':
             session.temp_username = data
             session.auth_state = 'login_password'
-            session.socket.send("Password: ".encode('utf-8'))
+            session.send("Password: ")
 
         elif session.auth_state == 'login_password':
-            success, result = self.db.authenticate_user(session.temp_username, data)
+            success, result = await self.loop.run_in_executor(
+                self.auth_pool, self.db.authenticate_user, session.temp_username, data
+            )
             if success:
                 session.authenticated = True
                 session.user_id = result
@@ -197,233 +441,161 @@ class MUDServer:
 
                 # Get user info to find current room
                 user_info = self.db.get_user_info(session.user_id)
-                current_room = user_info['current_room'] if user_info else 'alamo_plaza'
+                session.current_room = user_info['current_room'] if user_info else 'alamo_plaza'
+                self.room_occupants[session.current_room].add(session)
+                self.authed_sessions[session] = None
 
                 msg = f"Welcome back, {session.username}!\n"
                 msg += "You are at The Alamo Plaza\n\n"
-                msg += self.get_cute_player_box(session.user_id, current_room)
+                msg += self.get_cute_player_box(session, session.current_room)
                 msg += "Type 'help' to see available commands\n> "
-                session.socket.send(msg.encode('utf-8'))
+                session.send(msg)
             else:
                 msg = f"Login failed: {result}\n"
                 msg += "Type 'login' to try again or 'signup' to create account\n> "
-                session.socket.send(msg.encode('utf-8'))
+                session.send(msg)
                 session.auth_state = 'welcome'
 
         elif session.auth_state == 'signup_username':
             session.temp_username = data
             session.auth_state = 'signup_password'
-            session.socket.send("Choose a password: ".encode('utf-8'))
+            session.send("Choose a password: ")
 
         elif session.auth_state == 'signup_password':
-            success, message = self.db.create_user(session.temp_username, data)
+            success, result = await self.loop.run_in_executor(
+                self.auth_pool, self.db.create_user, session.temp_username, data
+            )
             if success:
                 session.authenticated = True
                 session.username = session.temp_username
-                # Get the user ID
-                auth_success, user_id = self.db.authenticate_user(session.temp_username, data)
-                if auth_success:
-                    session.user_id = user_id
+                session.user_id = result
+                session.current_room = 'alamo_plaza'
+                self.room_occupants[session.current_room].add(session)
+                self.authed_sessions[session] = None
 
                 msg = f"Account created! Welcome to the San Antonio MUD, {session.temp_username}!\n\n"
-                msg += "=== WELCOME GUIDE ===\n"
-                msg += "You're now in The Alamo Plaza. Here are some basic commands to get started:\n\n"
-                msg += "🔍 Exploring:\n"
-                msg += "  'look' - See your surroundings, exits, people, and items\n"
-                msg += "  'n/s/e/w' - Move north/south/east/west\n"
-                msg += "  'where' - Check your current location\n\n"
-                msg += "💬 Communication:\n"
-                msg += "  'say <message>' - Talk to people in the same room\n"
-                msg += "  'shout <message>' - Send message to everyone in the world\n"
-                msg += "  'who' - See who's online\n\n"
-                msg += "🎒 Items:\n"
-                msg += "  'get <item>' - Pick up items you find\n"
-                msg += "  'drop <item>' - Drop items from your inventory\n"
-                msg += "  'inventory' (or 'inv') - See what you're carrying\n\n"
-                msg += "🗣️ NPCs:\n"
-                msg += "  'talk <npc>' - Chat with characters (try keywords!)\n\n"
-                msg += "❓ Need help? Type 'help' anytime!\n"
-                msg += "==================\n\n"
-                msg += "You appear at The Alamo Plaza\n\n"
-                msg += self.get_cute_player_box(session.user_id, 'alamo_plaza')
+                session.send(msg)
+                session.send_bytes(SIGNUP_GUIDE_MSG)
+                msg = "You appear at The Alamo Plaza\n\n"
+                msg += self.get_cute_player_box(session, session.current_room)
                 msg += "> "
-                session.socket.send(msg.encode('utf-8'))
+                session.send(msg)
             else:
-                msg = f"Signup failed: {message}\n"
+                msg = f"Signup failed: {result}\n"
                 msg += "Type 'signup' to try again or 'login' to sign in\n> "
-                session.socket.send(msg.encode('utf-8'))
+                session.send(msg)
                 session.auth_state = 'welcome'
 
     def handle_game_command(self, session, data):
         """Handle game commands for authenticated users"""
         command_parts = data.strip().split()
         if not command_parts:
-            session.socket.send("> ".encode('utf-8'))
+            session.send_bytes(PROMPT)
             return
 
-        command = command_parts[0].lower()
-
-        if command == 'quit':
-            session.socket.send("Goodbye! Your progress has been saved.\n".encode('utf-8'))
-            session.socket.close()
-        elif command == 'help':
-            self.send_help(session)
-        elif command == 'who':
-            self.handle_who(session)
-        elif command == 'where':
-            self.handle_where(session)
-        elif command == 'look':
-            self.handle_look(session)
-        elif command in ['move', 'go'] and len(command_parts) > 1:
+        handler = self.COMMANDS.get(command_parts[0].lower())
+        if handler is None:
+            session.send(f"Unknown command: {data}\nType 'help' for available commands\n> ")
+        else:
+            handler(self, session, command_parts)
+
+    def _cmd_quit(self, session, command_parts):
+        """Say goodbye and disconnect"""
+        session.send("Goodbye! Your progress has been saved.\n")
+        session.close()
+
+    def _cmd_move(self, session, command_parts):
+        """move/go <direction>"""
+        if len(command_parts) > 1:
             self.handle_move(session, command_parts[1])
-        elif command in ['n', 'north', 's', 'south', 'e', 'east', 'w', 'west']:
-            self.handle_move(session, command)
-        elif command == 'say' and len(command_parts) > 1:
+        else:
+            session.send(f"Unknown command: {command_parts[0]}\nType 'help' for available commands\n> ")
+
+    def _cmd_say(self, session, command_parts):
+        """say <message>"""
+        if len(command_parts) > 1:
             self.handle_say(session, ' '.join(command_parts[1:]))
-        elif command == 'shout' and len(command_parts) > 1:
+        else:
+            session.send("Usage: say <message>\n> ")
+
+    def _cmd_shout(self, session, command_parts):
+        """shout <message>"""
+        if len(command_parts) > 1:
             self.handle_shout(session, ' '.join(command_parts[1:]))
-        elif command == 'talk' and len(command_parts) > 1:
+        else:
+            session.send("Usage: shout <message>\n> ")
+
+    def _cmd_talk(self, session, command_parts):
+        """talk <npc_name> [keyword]"""
+        if len(command_parts) > 1:
             npc_name = command_parts[1]
             keyword = ' '.join(command_parts[2:]) if len(command_parts) > 2 else 'default'
             self.handle_talk(session, npc_name, keyword)
-        elif command == 'get' and len(command_parts) > 1:
-            item_name = ' '.join(command_parts[1:])
-            self.handle_get(session, item_name)
-        elif command == 'drop' and len(command_parts) > 1:
-            item_name = ' '.join(command_parts[1:])
-            self.handle_drop(session, item_name)
-        elif command in ['inventory', 'inv', 'i']:
-            self.handle_inventory(session)
         else:
-            if command in ['say', 'shout']:
-                msg = f"Usage: {command} <message>\n> "
-            elif command == 'talk':
-                msg = "Usage: talk <npc_name> [keyword]\n> "
-            elif command == 'get':
-                msg = "Usage: get <item>\n> "
-            elif command == 'drop':
-                msg = "Usage: drop <item>\n> "
-            else:
-                msg = f"Unknown command: {data}\nType 'help' for available commands\n> "
-            session.socket.send(msg.encode('utf-8'))
+            session.send("Usage: talk <npc_name> [keyword]\n> ")
+
+    def _cmd_get(self, session, command_parts):
+        """get <item>"""
+        if len(command_parts) > 1:
+            self.handle_get(session, ' '.join(command_parts[1:]))
+        else:
+            session.send("Usage: get <item>\n> ")
+
+    def _cmd_drop(self, session, command_parts):
+        """drop <item>"""
+        if len(command_parts) > 1:
+            self.handle_drop(session, ' '.join(command_parts[1:]))
+        else:
+            session.send("Usage: drop <item>\n> ")
 
     def send_help(self, session):
         """Send help message"""
-        help_msg = "=== SAN ANTONIO MUD COMMANDS ===\n\n"
-        help_msg += "🔍 EXPLORING:\n"
-        help_msg += "  look - Show room description, exits, people, and items\n"
-        help_msg += "  move <direction> - Move to another room\n"
-        help_msg += "  n/s/e/w - Quick movement (north/south/east/west)\n"
-        help_msg += "  where - Show your current location\n\n"
-        help_msg += "🎒 ITEMS:\n"
-        help_msg += "  get <item> - Pick up an item from the room\n"
-        help_msg += "  drop <item> - Drop an item from your inventory\n"
-        help_msg += "  inventory (inv/i) - Show what you're carrying\n\n"
-        help_msg += "🗣️ NPCs:\n"
-        help_msg += "  talk <npc> [keyword] - Talk to NPCs (try: history, food, music)\n\n"
-        help_msg += "💬 COMMUNICATION:\n"
-        help_msg += "  say <message> - Talk to people in the same room\n"
-        help_msg += "  shout <message> - Send message to all players\n"
-        help_msg += "  who - Show online players\n\n"
-        help_msg += "⚙️ SYSTEM:\n"
-        help_msg += "  help - Show this help\n"
-        help_msg += "  quit - Exit the MUD\n\n"
-        help_msg += "💡 TIP: Most commands work with partial names!\n"
-        help_msg += "    Example: 'get guitar' instead of 'get a tortoiseshell guitar pick'\n"
-        help_msg += "===============================\n> "
-        session.socket.send(help_msg.encode('utf-8'))
+        session.send_bytes(HELP_MSG)
 
     def handle_who(self, session):
         """Handle who command"""
-        online_users = [s.username for s in self.sessions.values() if s.authenticated]
-        msg = f"Online players: {', '.join(online_users)}\n> "
-        session.socket.send(msg.encode('utf-8'))
+        msg = f"Online players: {', '.join(s.username for s in self.authed_sessions)}\n> "
+        session.send(msg)
 
     def handle_where(self, session):
         """Handle where command"""
-        user_info = self.db.get_user_info(session.user_id)
-        if user_info:
-            room = self.db.get_room(user_info['current_room'])
-            if room:
-                msg = f"You are at {room['name']}\n> "
-            else:
-                msg = "You are in an unknown location\n> "
+        room = self.get_room(session.current_room)
+        if room:
+            msg = f"You are at {room['name']}\n> "
         else:
-            msg = "Unable to determine your location\n> "
-        session.socket.send(msg.encode('utf-8'))
+            msg = "You are in an unknown location\n> "
+        session.send(msg)
 
     def handle_look(self, session):
         """Handle look command"""
-        user_info = self.db.get_user_info(session.user_id)
-        if not user_info:
-            session.socket.send("Unable to look around\n> ".encode('utf-8'))
-            return
-
-        room = self.db.get_room(user_info['current_room'])
+        room = self.get_room(session.current_room)
         if not room:
-            session.socket.send("You are in a void...\n> ".encode('utf-8'))
+            session.send("You are in a void...\n> ")
             return
 
-        # Build room description
-        msg = f"{room['name']}\n"
-        msg += f"{room['description']}\n"
-
-        # Show exits
-        if room['exits']:
-            exits_list = list(room['exits'].keys())
-            msg += f"Exits: {', '.join(exits_list)}\n"
-        else:
-            msg += "No obvious exits\n"
-
-        # Show players in room
-        players_here = self.db.get_users_in_room(user_info['current_room'])
-        players_here = [p for p in players_here if p != session.username]  # Exclude self
-        total_players = len(players_here) + 1  # +1 for current player
-
-        # Add cute player count box
-        msg += self.get_cute_player_box(session.user_id, user_info['current_room'])
-
-        # Show NPCs in room
-        npcs_here = self.db.get_npcs_in_room(user_info['current_room'])
-        if npcs_here:
-            msg += f"NPCs here:\n"
-            for npc in npcs_here:
-                msg += f"  {npc['name']} - {npc['description']}\n"
-        else:
-            msg += "NPCs here: none\n"
+        # Room description, exits and NPCs are pre-rendered; only players and items vary
+        session.send_bytes(room['static_bytes'])
+        session.send(self.get_cute_player_box(session, room['id']))
+        session.send_bytes(room['npc_bytes'])
 
         # Show items in room
-        items_here = self.db.get_items_in_room(user_info['current_room'])
+        items_here, _, listing = self.get_items('room', room['id'])
         if items_here:
-            msg += f"Items here:\n"
-            for item in items_here:
-                msg += f"  {item['name']} - {item['description']}\n"
+            session.send_bytes(b"Items here:\n" + listing)
         else:
-            msg += "Items here: none\n"
+            session.send("Items here: none\n")
 
-        msg += "> "
-        session.socket.send(msg.encode('utf-8'))
+        session.send_bytes(PROMPT)
 
     def handle_move(self, session, direction):
         """Handle movement commands"""
         # Normalize direction
-        direction_map = {
-            'n': 'north', 'north': 'north',
-            's': 'south', 'south': 'south',
-            'e': 'east', 'east': 'east',
-            'w': 'west', 'west': 'west'
-        }
-
-        direction = direction_map.get(direction.lower(), direction.lower())
-
-        user_info = self.db.get_user_info(session.user_id)
-        if not user_info:
-            session.socket.send("Unable to move\n> ".encode('utf-8'))
-            return
+        direction = direction.lower()
+        direction = DIRECTION_MAP.get(direction, direction)
 
-        current_room = self.db.get_room(user_info['current_room'])
+        current_room = self.get_room(session.current_room)
         if not current_room:
-            session.socket.send("You are lost in the void\n> ".encode('utf-8'))
+            session.send("You are lost in the void\n> ")
             return
 
         # Check if direction is valid
@@ -433,120 +605,79 @@ class MUDServer:
                 exits_list = list(current_room['exits'].keys())
                 msg += f"Available exits: {', '.join(exits_list)}\n"
             msg += "> "
-            session.socket.send(msg.encode('utf-8'))
+            session.send(msg)
             return
 
         # Move to new room
         new_room_id = current_room['exits'][direction]
-        new_room = self.db.get_room(new_room_id)
+        new_room = self.get_room(new_room_id)
 
         if not new_room:
-            session.socket.send("That way leads nowhere\n> ".encode('utf-8'))
+            session.send("That way leads nowhere\n> ")
             return
 
         # Update user location
         success = self.db.update_user_room(session.user_id, new_room_id)
         if success:
-            msg = f"You head {direction}.\n\n"
-            msg += f"{new_room['name']}\n"
-            msg += f"{new_room['description']}\n"
-
-            # Show exits
-            if new_room['exits']:
-                exits_list = list(new_room['exits'].keys())
-                msg += f"Exits: {', '.join(exits_list)}\n"
-            else:
-                msg += "No obvious exits\n"
+            self.room_occupants[session.current_room].discard(session)
+            self.room_occupants[new_room_id].add(session)
+            session.current_room = new_room_id
 
-            # Show players in new room
-            players_here = self.db.get_users_in_room(new_room_id)
-            players_here = [p for p in players_here if p != session.username]
-            total_players = len(players_here) + 1  # +1 for current player
+            session.send(f"You head {direction}.\n\n")
+            session.send_bytes(new_room['static_bytes'])
 
             # Add cute player count box
-            msg += self.get_cute_player_box(session.user_id, new_room_id)
-
-            msg += "> "
-            session.socket.send(msg.encode('utf-8'))
+            session.send(self.get_cute_player_box(session, new_room_id))
+            session.send_bytes(PROMPT)
         else:
-            session.socket.send("Something went wrong trying to move\n> ".encode('utf-8'))
+            session.send("Something went wrong trying to move\n> ")
 
     def handle_say(self, session, message):
         """Handle say command - send message to players in same room"""
-        user_info = self.db.get_user_info(session.user_id)
-        if not user_info:
-            session.socket.send("Unable to speak\n> ".encode('utf-8'))
-            return
-
-        current_room = user_info['current_room']
+        current_room = session.current_room
 
         # Format the message
         chat_msg = f"[Room] {session.username}: {message}\n"
+        payload = chat_msg.encode('utf-8') + PROMPT
 
         # Send to all players in the same room
         players_notified = 0
-        for client_socket, other_session in self.sessions.items():
-            if (other_session.authenticated and
-                other_session.user_id != session.user_id):  # Don't send to self
-
-                other_user_info = self.db.get_user_info(other_session.user_id)
-                if (other_user_info and
-                    other_user_info['current_room'] == current_room):
-
-                    try:
-                        other_session.socket.send(chat_msg.encode('utf-8'))
-                        other_session.socket.send("> ".encode('utf-8'))
-                        players_notified += 1
-                    except:
-                        # Handle broken connections
-                        pass
+        for other_session in self.room_occupants.get(current_room, ()):
+            if other_session.user_id != session.user_id:  # Don't send to self
+                other_session.send_bytes(payload)
+                players_notified += 1
 
         # Confirm to sender
         confirm_msg = f"[Room] {session.username}: {message}\n"
         if players_notified == 0:
             confirm_msg += "(No one else is here to hear you)\n"
         confirm_msg += "> "
-        session.socket.send(confirm_msg.encode('utf-8'))
+        session.send(confirm_msg)
 
     def handle_shout(self, session, message):
         """Handle shout command - send message to all players in the world"""
         # Format the message
         chat_msg = f"[Global] {session.username}: {message}\n"
+        payload = chat_msg.encode('utf-8') + PROMPT
 
         # Send to all authenticated players
         players_notified = 0
-        for client_socket, other_session in self.sessions.items():
-            if other_session.authenticated:
-                try:
-                    other_session.socket.send(chat_msg.encode('utf-8'))
-                    other_session.socket.send("> ".encode('utf-8'))
-                    players_notified += 1
-                except:
-                    # Handle broken connections
-                    pass
+        for other_session in self.authed_sessions:
+            other_session.send_bytes(payload)
+            players_notified += 1
 
         # Don't send separate confirmation since sender also receives the global message
 
     def handle_talk(self, session, npc_name, keyword):
         """Handle talk command - interact with NPCs"""
-        user_info = self.db.get_user_info(session.user_id)
-        if not user_info:
-            session.socket.send("Unable to talk\n> ".encode('utf-8'))
-            return
+        current_room = session.current_room
 
         # Get NPCs in current room
-        npcs_here = self.db.get_npcs_in_room(user_info['current_room'])
+        room = self.get_room(current_room)
+        npcs_here = room['npcs'] if room else []
 
         # Find the NPC by name (case insensitive, partial match)
-        target_npc = None
-        npc_name_lower = npc_name.lower()
-
-        for npc in npcs_here:
-            # Check if the input matches the NPC name (partial match)
-            if (npc_name_lower in npc['name'].lower() or
-                any(npc_name_lower in word.lower() for word in npc['name'].split())):
-                target_npc = npc
-                break
+        target_npc = find_by_name(room['npc_index'], npc_name) if room else None
 
         if not target_npc:
             msg = f"There's no '{npc_name}' here to talk to.\n"
@@ -554,7 +685,7 @@ class MUDServer:
                 npc_names = [npc['name'] for npc in npcs_here]
                 msg += f"Available NPCs: {', '.join(npc_names)}\n"
             msg += "> "
-            session.socket.send(msg.encode('utf-8'))
+            session.send(msg)
             return
 
         # Find response for keyword
@@ -578,45 +709,25 @@ class MUDServer:
 
         # Format and send response
         msg = f"{target_npc['name']} says: \"{response}\"\n> "
-        session.socket.send(msg.encode('utf-8'))
+        session.send(msg)
 
         # Let other players in the room see the conversation
-        for client_socket, other_session in self.sessions.items():
-            if (other_session.authenticated and
-                other_session.user_id != session.user_id):  # Don't send to self
-
-                other_user_info = self.db.get_user_info(other_session.user_id)
-                if (other_user_info and
-                    other_user_info['current_room'] == user_info['current_room']):
-
-                    try:
-                        observer_msg = f"{session.username} talks to {target_npc['name']} about {keyword}.\n"
-                        observer_msg += f"{target_npc['name']} says: \"{response}\"\n"
-                        other_session.socket.send(observer_msg.encode('utf-8'))
-                        other_session.socket.send("> ".encode('utf-8'))
-                    except:
-                        pass
+        observer_msg = f"{session.username} talks to {target_npc['name']} about {keyword}.\n"
+        observer_msg += f"{target_npc['name']} says: \"{response}\"\n"
+        payload = observer_msg.encode('utf-8') + PROMPT
+        for other_session in self.room_occupants.get(current_room, ()):
+            if other_session.user_id != session.user_id:  # Don't send to self
+                other_session.send_bytes(payload)
 
     def handle_get(self, session, item_name):
         """Handle get command - pick up items"""
-        user_info = self.db.get_user_info(session.user_id)
-        if not user_info:
-            session.socket.send("Unable to get item\n> ".encode('utf-8'))
-            return
+        current_room = session.current_room
 
         # Get items in current room
-        items_here = self.db.get_items_in_room(user_info['current_room'])
+        items_here, item_index, _ = self.get_items('room', current_room)
 
         # Find the item by name (case insensitive, partial match)
-        target_item = None
-        item_name_lower = item_name.lower()
-
-        for item in items_here:
-            # Check if the input matches the item name (partial match)
-            if (item_name_lower in item['name'].lower() or
-                any(item_name_lower in word.lower() for word in item['name'].split())):
-                target_item = item
-                break
+        target_item = find_by_name(item_index, item_name)
 
         if not target_item:
             msg = f"There's no '{item_name}' here to get.\n"
@@ -624,53 +735,33 @@ class MUDServer:
                 item_names = [item['name'] for item in items_here]
                 msg += f"Available items: {', '.join(item_names)}\n"
             msg += "> "
-            session.socket.send(msg.encode('utf-8'))
+            session.send(msg)
             return
 
         # Move item to player's inventory
         success = self.db.move_item(target_item['id'], 'player', session.user_id)
         if success:
+            self.forget_items(session)
             msg = f"You get {target_item['name']}.\n> "
-            session.socket.send(msg.encode('utf-8'))
+            session.send(msg)
 
             # Let other players see the action
-            for client_socket, other_session in self.sessions.items():
-                if (other_session.authenticated and
-                    other_session.user_id != session.user_id):
-
-                    other_user_info = self.db.get_user_info(other_session.user_id)
-                    if (other_user_info and
-                        other_user_info['current_room'] == user_info['current_room']):
-
-                        try:
-                            observer_msg = f"{session.username} gets {target_item['name']}.\n"
-                            other_session.socket.send(observer_msg.encode('utf-8'))
-                            other_session.socket.send("> ".encode('utf-8'))
-                        except:
-                            pass
+            payload = f"{session.username} gets {target_item['name']}.\n".encode('utf-8') + PROMPT
+            for other_session in self.room_occupants.get(current_room, ()):
+                if other_session.user_id != session.user_id:
+                    other_session.send_bytes(payload)
         else:
-            session.socket.send("You can't get that item\n> ".encode('utf-8'))
+            session.send("You can't get that item\n> ")
 
     def handle_drop(self, session, item_name):
         """Handle drop command - drop items from inventory"""
-        user_info = self.db.get_user_info(session.user_id)
-        if not user_info:
-            session.socket.send("Unable to drop item\n> ".encode('utf-8'))
-            return
+        current_room = session.current_room
 
         # Get items in player's inventory
-        player_items = self.db.get_player_items(session.user_id)
+        player_items, item_index, _ = self.get_items('player', session.user_id)
 
         # Find the item by name (case insensitive, partial match)
-        target_item = None
-        item_name_lower = item_name.lower()
-
-        for item in player_items:
-            # Check if the input matches the item name (partial match)
-            if (item_name_lower in item['name'].lower() or
-                any(item_name_lower in word.lower() for word in item['name'].split())):
-                target_item = item
-                break
+        target_item = find_by_name(item_index, item_name)
 
         if not target_item:
             msg = f"You don't have '{item_name}' to drop.\n"
@@ -680,65 +771,72 @@ class MUDServer:
             else:
                 msg += "You're not carrying anything.\n"
             msg += "> "
-            session.socket.send(msg.encode('utf-8'))
+            session.send(msg)
             return
 
         # Move item to current room
-        success = self.db.move_item(target_item['id'], 'room', user_info['current_room'])
+        success = self.db.move_item(target_item['id'], 'room', current_room)
         if success:
+            self.forget_items(session)
             msg = f"You drop {target_item['name']}.\n> "
-            session.socket.send(msg.encode('utf-8'))
+            session.send(msg)
 
             # Let other players see the action
-            for client_socket, other_session in self.sessions.items():
-                if (other_session.authenticated and
-                    other_session.user_id != session.user_id):
-
-                    other_user_info = self.db.get_user_info(other_session.user_id)
-                    if (other_user_info and
-                        other_user_info['current_room'] == user_info['current_room']):
-
-                        try:
-                            observer_msg = f"{session.username} drops {target_item['name']}.\n"
-                            other_session.socket.send(observer_msg.encode('utf-8'))
-                            other_session.socket.send("> ".encode('utf-8'))
-                        except:
-                            pass
+            payload = f"{session.username} drops {target_item['name']}.\n".encode('utf-8') + PROMPT
+            for other_session in self.room_occupants.get(current_room, ()):
+                if other_session.user_id != session.user_id:
+                    other_session.send_bytes(payload)
         else:
-            session.socket.send("You can't drop that item\n> ".encode('utf-8'))
+            session.send("You can't drop that item\n> ")
 
     def handle_inventory(self, session):
         """Handle inventory command - show what player is carrying"""
-        player_items = self.db.get_player_items(session.user_id)
+        player_items, _, listing = self.get_items('player', session.user_id)
 
         if player_items:
-            msg = "You are carrying:\n"
-            for item in player_items:
-                msg += f"  {item['name']} - {item['description']}\n"
+            session.send_bytes(b"You are carrying:\n" + listing)
         else:
-            msg = "You're not carrying anything.\n"
+            session.send("You're not carrying anything.\n")
 
-        msg += "> "
-        session.socket.send(msg.encode('utf-8'))
+        session.send_bytes(PROMPT)
 
     def stop(self):
-        """Stop the server"""
+        """Stop the server (safe to call from any thread)"""
         self.running = False
-
-        # Close all client connections
-        for client in self.clients:
+        if self.loop is not None:
             try:
-                client.close()
-            except:
+                self.loop.call_soon_threadsafe(self.stop_event.set)
+            except RuntimeError:
+                # Event loop already closed
                 pass
 
-        # Close server socket
-        try:
-            self.server_socket.close()
-        except:
-            pass
+    # Command word -> handler(self, session, command_parts)
+    COMMANDS = {
+        'quit': _cmd_quit,
+        'help': lambda self, session, command_parts: self.send_help(session),
+        'who': lambda self, session, command_parts: self.handle_who(session),
+        'where': lambda self, session, command_parts: self.handle_where(session),
+        'look': lambda self, session, command_parts: self.handle_look(session),
+        'move': _cmd_move,
+        'go': _cmd_move,
+        'n': lambda self, session, command_parts: self.handle_move(session, 'north'),
+        'north': lambda self, session, command_parts: self.handle_move(session, 'north'),
+        's': lambda self, session, command_parts: self.handle_move(session, 'south'),
+        'south': lambda self, session, command_parts: self.handle_move(session, 'south'),
+        'e': lambda self, session, command_parts: self.handle_move(session, 'east'),
+        'east': lambda self, session, command_parts: self.handle_move(session, 'east'),
+        'w': lambda self, session, command_parts: self.handle_move(session, 'west'),
+        'west': lambda self, session, command_parts: self.handle_move(session, 'west'),
+        'say': _cmd_say,
+        'shout': _cmd_shout,
+        'talk': _cmd_talk,
+        'get': _cmd_get,
+        'drop': _cmd_drop,
+        'inventory': lambda self, session, command_parts: self.handle_inventory(session),
+        'inv': lambda self, session, command_parts: self.handle_inventory(session),
+        'i': lambda self, session, command_parts: self.handle_inventory(session),
+    }
 
-        print("Server stopped")
 
 def main():
     server = MUDServer()